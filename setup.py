@@ -21,7 +21,9 @@ setup(name='TSO500Reporter',
       install_requires=[
           "jinja2",
           "matplotlib",
+          "numpy",
           "pandas",
+          "scipy",
           "seaborn",
           "weasyprint",
           ],
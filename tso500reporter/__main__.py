@@ -2,12 +2,16 @@
 Produces MSI and TMB reports given output files from the TSO500 local app
 """
 import argparse
+import json
 import os
+import warnings
 
 import pandas as pd
 
-from . import parser, plotter, reporter
-from .constants import TMB_FIELDS, MSI_FIELDS
+from . import cohort, parser, planner, plotter, preflight, reporter
+from .cache import RenderCache
+from .constants import TMB_FIELDS, MSI_FIELDS, CACHE_DIR
+from .exceptions import PreflightError, PreflightWarning
 
 HTML_TEMPLATE_DIR = f"{os.path.dirname(__file__)}/templates"
 
@@ -16,10 +20,15 @@ def parse_arguments():
 
     parser = argparse.ArgumentParser()
 
-    parser.add_argument(
-            "-d", "--variant-data", nargs="+", required=True,
+    inputs = parser.add_mutually_exclusive_group(required=True)
+    inputs.add_argument(
+            "-d", "--variant-data", nargs="+",
             help="filepaths to <SAMPLE>_*CombinedVariantOutput.tsv files"
     )
+    inputs.add_argument(
+            "-r", "--run-dir",
+            help="directory to search for <SAMPLE>_*CombinedVariantOutput.tsv files"
+    )
     parser.add_argument(
             "-s", "--samplesheet", required=True,
             help="samplesheet"
@@ -32,17 +41,77 @@ def parse_arguments():
             "-p", "--pdf", action="store_true", default=False,
             help="include PDF report"
     )
+    parser.add_argument(
+            "-c", "--cohort", action="store_true", default=False,
+            help="include cohort statistics for variants, amplifications and fusions"
+    )
+    parser.add_argument(
+            "--cache-dir", default=CACHE_DIR,
+            help="directory to cache rendered plots, tables and PDFs"
+    )
+    parser.add_argument(
+            "--no-cache", action="store_true", default=False,
+            help="always re-render plots, tables and PDFs"
+    )
+
+    parser.add_argument(
+            "--preflight", action="store_true", default=False,
+            help="only check the input files and print a JSON report"
+    )
+    parser.add_argument(
+            "--preflight-workers", type=int, default=None,
+            help="number of processes for preflight checks "
+                 "(default: serial for small runs, else one per CPU)"
+    )
 
     args = parser.parse_args()
 
     return args
 
-def main(variant_data, samplesheet, output="report", pdf=True):
-    variant_df = parser.parse_variant_stats_data(*variant_data)
+def preflight_inputs(samplesheet, variant_data, workers=None):
+    """
+    Checks the samplesheet, plans the report inputs from it, then checks
+    only the CVO files that will be reported on. Returns the combined
+    preflight report and the plan, which is `None` if the samplesheet
+    failed its checks.
+    """
+    report = preflight.run_preflight(samplesheet, [], workers)
+    if not report.ok:
+        return report, None
+
+    plan = planner.InputPlan(samplesheet, variant_data=variant_data)
+    variant_report = preflight.run_preflight(None, plan.variant_files, workers)
+
+    report = preflight.PreflightReport(
+            report.filenames + variant_report.filenames,
+            report.issues + variant_report.issues)
+    return report, plan
+
+def main(variant_data, samplesheet, output="report", pdf=True, cohort_stats=False,
+         cache_dir=CACHE_DIR, run_dir=None, preflight_workers=None):
+    cache = RenderCache(cache_dir) if cache_dir else None
+
+    if variant_data is None:
+        variant_data = planner.discover_variant_files(run_dir)
+
+    # match files to the samplesheet first, so that only the CVO files
+    # which end up in the report are checked and parsed, and catch
+    # malformed or half-written inputs before any heavy work
+    report, plan = preflight_inputs(samplesheet, variant_data, preflight_workers)
+    if not report.ok:
+        raise PreflightError(report)
+
+    for issue in report.warnings:
+        warnings.warn(str(issue), PreflightWarning)
+
+    if not plan.variant_files:
+        raise SystemExit("No CombinedVariantOutput files to report on")
+
+    records = [parser.CombinedVariantOutput(f) for f in plan.variant_files]
+    variant_df = parser.variant_stats_from_records(*records)
 
     # filter RNA samples
-    samplesheet = parser.SampleSheet(samplesheet)
-    samplesheet_df = pd.DataFrame(samplesheet.data)
+    samplesheet_df = pd.DataFrame(plan.samplesheet.data)
     variant_df = pd.merge(
             variant_df,
             samplesheet_df,
@@ -52,42 +121,65 @@ def main(variant_data, samplesheet, output="report", pdf=True):
     variant_df = variant_df.loc[lambda df: df["Sample_Type"] != "RNA", :]
 
     # make output file
-    os.makedirs(f"{output}/img")
+    os.makedirs(f"{output}/img", exist_ok=True)
 
     # plot and save TMB data
-    tmb_fig = plotter.generate_plot(
+    plotter.save_plot(
             dataset=variant_df,
             x_column="DNA Sample ID",
             y_columns=TMB_FIELDS,
+            filepath=f"{output}/img/tmb.png",
             fwidth=20,
-            fheight=5)
-    tmb_fig.savefig(f"{output}/img/tmb.png", bbox_inches="tight")
+            fheight=5,
+            cache=cache)
 
     # plot and save MSI data
-    msi_fig = plotter.generate_plot(
+    plotter.save_plot(
             dataset=variant_df,
             x_column="DNA Sample ID",
             y_columns=MSI_FIELDS,
+            filepath=f"{output}/img/msi.png",
             fwidth=20,
-            fheight=5)
-    msi_fig.savefig(f"{output}/img/msi.png", bbox_inches="tight")
+            fheight=5,
+            cache=cache)
+
+    # Optionally summarise variants, amplifications and fusions across
+    # the DNA samples in the report
+    cohort_data = None
+    if cohort_stats:
+        dna_samples = set(variant_df["DNA Sample ID"])
+        dna_records = [
+                record for record in records
+                if record.analysis_details["DNA Sample ID"] in dna_samples]
+        cohort_data = cohort.cohort_tables(cohort.build_cohort(dna_records))
 
     # Write HTML report
     # need sequencing run header from one of the CVO files
-    cvo = parser.CombinedVariantOutput(variant_data[0])
-    run_name = cvo.sequencing_run_details["Run Name"]
+    run_name = records[0].sequencing_run_details["Run Name"]
     reporter.write_html(
             variant_df,
             embed=True,
             run_name=run_name,
             report_dir=output,
-            template_dir=HTML_TEMPLATE_DIR)
+            template_dir=HTML_TEMPLATE_DIR,
+            cohort_data=cohort_data,
+            cache=cache)
 
     # Optionally write PDF report
     if pdf:
-        reporter.write_pdf(output)
+        reporter.write_pdf(output, cache=cache)
 
 if __name__ == "__main__":
 
     args = parse_arguments()
-    main(args.variant_data, args.samplesheet, args.output, args.pdf)
+
+    if args.preflight:
+        variant_data = args.variant_data or planner.discover_variant_files(args.run_dir)
+        report, _ = preflight_inputs(
+                args.samplesheet, variant_data, args.preflight_workers)
+        print(json.dumps(report.to_dict(), indent=4))
+        raise SystemExit(0 if report.ok else 1)
+
+    cache_dir = None if args.no_cache else args.cache_dir
+    main(args.variant_data, args.samplesheet, args.output, args.pdf, args.cohort,
+         cache_dir, args.run_dir, args.preflight_workers)
@@ -0,0 +1,234 @@
+"""
+Content-addressed cache for rendered plots, HTML fragments and reports
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+from typing import Any, List, Optional, Tuple
+
+import pandas as pd
+
+from .constants import CACHE_MAX_BYTES
+
+# bump when the rendering code changes in a way that alters its output
+CACHE_VERSION = "1"
+
+# prefix of partially written entries, which eviction must not touch
+TEMP_PREFIX = ".tmp-"
+
+
+def make_key(*parts: Any) -> str:
+    """
+    Hashes the given parts into a single cache key. `pd.DataFrame` parts
+    are hashed by content (values, index, column names and dtypes); all
+    other parts are hashed by their `repr()`, or as-is for `bytes`.
+
+    Args:
+        parts: values that together determine the rendered output
+
+    Returns:
+        the key as a hex digest
+    """
+    digest = hashlib.sha256(CACHE_VERSION.encode())
+
+    for part in parts:
+        if isinstance(part, pd.DataFrame):
+            digest.update(repr(list(part.columns)).encode())
+            digest.update(repr(list(part.dtypes.astype(str))).encode())
+            digest.update(pd.util.hash_pandas_object(part, index=True).values.tobytes())
+        elif isinstance(part, bytes):
+            digest.update(part)
+        else:
+            digest.update(repr(part).encode())
+        # separator so that ("ab", "c") and ("a", "bc") differ
+        digest.update(b"\0")
+
+    return digest.hexdigest()
+
+
+class RenderCache(object):
+    """
+    Size-bounded, content-addressed store of rendered artifacts. Entries
+    are files named by their key; once the cache grows beyond `max_bytes`,
+    the least recently used entries are evicted.
+
+    Basic usage:
+
+        >>> from tso500reporter.cache import RenderCache, make_key
+        >>> cache = RenderCache("~/.cache/tso500reporter")
+        >>> key = make_key("table", df)
+        >>> cache.get(key, ".html") or cache.put(key, ".html", html.encode())
+
+    Attributes:
+        cache_dir: directory holding the cached artifacts
+        max_bytes: maximum total size of the cache in bytes
+    """
+    def __init__(self, cache_dir: str, max_bytes: int = CACHE_MAX_BYTES) -> None:
+        """
+        Inits RenderCache with the cache directory and its size limit.
+        The directory is created if it does not exist.
+
+        Args:
+            cache_dir: directory holding the cached artifacts
+            max_bytes: maximum total size of the cache in bytes
+        """
+        self.cache_dir = os.path.expanduser(cache_dir)
+        self.max_bytes = max_bytes
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # estimate of the cache size, so the directory is only walked
+        # when the limit may have been crossed
+        self._size = None
+
+    def _path(self, key: str, suffix: str) -> str:
+        """
+        Returns the path of the entry for a key
+        """
+        return os.path.join(self.cache_dir, key[:2], f"{key}{suffix}")
+
+    def get(self, key: str, suffix: str = "") -> Optional[str]:
+        """
+        Looks up an entry, marking it as recently used
+
+        Args:
+            key: key as produced by `make_key()`
+            suffix: file extension of the artifact
+
+        Returns:
+            path to the cached artifact, or `None` if not cached
+        """
+        path = self._path(key, suffix)
+
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            # not cached, or evicted by another process
+            return None
+
+        return path
+
+    def get_text(self, key: str, suffix: str = "") -> Optional[str]:
+        """
+        Looks up an entry and returns its contents as text, or `None`
+        if not cached
+        """
+        path = self.get(key, suffix)
+
+        if path is None:
+            return None
+
+        try:
+            with open(path, "r") as f:
+                return f.read()
+        except FileNotFoundError:
+            # evicted by another process since the lookup
+            return None
+
+    def put(self, key: str, suffix: str, data: bytes) -> str:
+        """
+        Stores an artifact, then evicts old entries if the cache is
+        over its size limit. Writes are atomic, so concurrent readers
+        never see a partially written entry.
+
+        Args:
+            key: key as produced by `make_key()`
+            suffix: file extension of the artifact
+            data: contents of the artifact
+
+        Returns:
+            path to the cached artifact
+        """
+        path = self._path(key, suffix)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        try:
+            replaced_size = os.stat(path).st_size
+        except FileNotFoundError:
+            replaced_size = 0
+
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=TEMP_PREFIX)
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        if self._size is None:
+            self._size = sum(size for _, size, _ in self._entries())
+        else:
+            self._size += len(data) - replaced_size
+
+        if self._size > self.max_bytes:
+            self.evict(keep=path)
+
+        return path
+
+    def put_file(self, key: str, suffix: str, filepath: str) -> str:
+        """
+        Stores a copy of an existing file. See `RenderCache.put()`.
+        """
+        with open(filepath, "rb") as f:
+            return self.put(key, suffix, f.read())
+
+    def fetch(self, key: str, suffix: str, filepath: str) -> bool:
+        """
+        Copies a cached artifact to `filepath`, if it is cached
+
+        Returns:
+            True if the artifact was found and copied
+        """
+        path = self.get(key, suffix)
+
+        if path is None:
+            return False
+
+        try:
+            shutil.copyfile(path, filepath)
+        except FileNotFoundError:
+            # evicted by another process since the lookup
+            return False
+
+        return True
+
+    def evict(self, keep: str = None) -> None:
+        """
+        Removes least recently used entries until the cache fits
+        within `max_bytes`
+
+        Args:
+            keep: path of an entry that must not be removed
+        """
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+        self._size = total
+
+    def _entries(self) -> List[Tuple[float, int, str]]:
+        """
+        Returns (last used time, size, path) of every complete entry,
+        skipping entries still being written by `RenderCache.put()`
+        """
+        entries = []
+
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if name.startswith(TEMP_PREFIX):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    # removed by another process
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+        return entries
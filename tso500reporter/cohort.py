@@ -0,0 +1,298 @@
+"""
+Builds sparse gene-by-sample matrices from `CombinedVariantOutput` data
+and computes cohort statistics (recurrence, percentiles, outliers)
+"""
+from typing import Dict, List, Sequence
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from .constants import (SMALL_VARIANT_FIELDS, GENE_AMPLIFICATION_FIELDS,
+        FUSION_FIELDS, COHORT_PERCENTILES)
+from .parser import CombinedVariantOutput
+
+
+class GeneMatrix(object):
+    """
+    Sparse gene-by-sample matrix. Each stored entry is one observation
+    of a gene (or gene pair) in a sample; genes that were not reported
+    for a sample are left unstored rather than held as zeros.
+
+    Basic usage:
+
+        >>> from tso500reporter.cohort import build_cohort, summarise
+        >>> matrices = build_cohort(cvos)
+        >>> summarise(matrices["fold_change"])
+
+    Attributes:
+        genes: row labels as a `np.ndarray`
+        samples: column labels as a `np.ndarray`
+        matrix: `scipy.sparse.csr_matrix` of shape (genes, samples)
+    """
+    def __init__(self,
+                 genes: np.ndarray,
+                 samples: np.ndarray,
+                 matrix: sparse.csr_matrix) -> None:
+        """
+        Inits GeneMatrix with row labels, column labels and the matrix itself
+
+        Args:
+            genes: row labels
+            samples: column labels
+            matrix: `scipy.sparse.csr_matrix` of shape (genes, samples)
+        """
+        self.genes = genes
+        self.samples = samples
+        self.matrix = matrix
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        Returns the matrix as a dense `pd.DataFrame`, with unstored
+        entries as `NaN`
+        """
+        dense = np.full(self.matrix.shape, np.nan)
+        coo = self.matrix.tocoo()
+        dense[coo.row, coo.col] = coo.data
+        return pd.DataFrame(dense, index=self.genes, columns=self.samples)
+
+
+def _collect(
+        records: Sequence[CombinedVariantOutput],
+        section: str,
+        key_field: str,
+        value_field: str = None):
+    """
+    Collects (key, sample index, value) triples for a tabular section
+    across all records. Rows with a missing key or a non-numeric value
+    are dropped. If `value_field` is not given, each row counts as 1.
+    """
+    keys = []
+    columns = []
+    values = []
+
+    for i, record in enumerate(records):
+        for row in record.json.get(section, []):
+            keys.append(row.get(key_field, "NA"))
+            columns.append(i)
+            values.append(row.get(value_field, "NA") if value_field else 1)
+
+    keys = np.asarray(keys, dtype=str)
+    columns = np.asarray(columns, dtype=np.int64)
+    values = pd.to_numeric(np.asarray(values, dtype=object), errors="coerce")
+    values = np.asarray(values, dtype=float)
+
+    keep = ~np.isnan(values) & (keys != "NA") & (keys != "")
+    return keys[keep], columns[keep], values[keep]
+
+
+def _build_matrix(
+        keys: np.ndarray,
+        columns: np.ndarray,
+        values: np.ndarray,
+        samples: np.ndarray,
+        reduce: str = "sum") -> GeneMatrix:
+    """
+    Builds a `GeneMatrix` from (key, sample index, value) triples.
+    Repeated (key, sample) pairs are combined with `reduce`, which
+    is either `"sum"` or `"max"`.
+    """
+    genes, rows = np.unique(keys, return_inverse=True)
+    shape = (len(genes), len(samples))
+
+    if reduce == "sum":
+        # COO -> CSR conversion sums duplicate entries
+        matrix = sparse.coo_matrix((values, (rows, columns)), shape=shape).tocsr()
+    elif reduce == "max":
+        # sort by cell then by descending value, keep the first of each cell
+        cells = rows * len(samples) + columns
+        order = np.lexsort((-values, cells))
+        cells = cells[order]
+        values = values[order]
+        first = np.r_[True, cells[1:] != cells[:-1]] if len(cells) else cells.astype(bool)
+        cells = cells[first]
+        matrix = sparse.csr_matrix(
+                (values[first], np.divmod(cells, len(samples))), shape=shape)
+    else:
+        raise ValueError(f"Unknown reduction: {reduce}")
+
+    matrix.sort_indices()
+    return GeneMatrix(genes, samples, matrix)
+
+
+def _row_quantiles(
+        data: np.ndarray,
+        indptr: np.ndarray,
+        q: Sequence[float]) -> np.ndarray:
+    """
+    Linearly-interpolated quantiles of the stored values in each row
+    of a CSR-layout matrix, computed for all rows in one pass.
+
+    Args:
+        data: stored values, grouped by row
+        indptr: CSR row pointer
+        q: quantiles in the range [0, 1]
+
+    Returns:
+        `np.ndarray` of shape (rows, len(q)); `NaN` for empty rows
+    """
+    q = np.asarray(q, dtype=float)
+    counts = np.diff(indptr)
+    result = np.full((len(counts), len(q)), np.nan)
+
+    if len(data) == 0:
+        return result
+
+    # sort values within each row, keeping rows in order
+    row_ids = np.repeat(np.arange(len(counts)), counts)
+    data = data[np.lexsort((data, row_ids))]
+
+    position = indptr[:-1, None] + q[None, :] * (counts[:, None] - 1)
+    position = np.clip(position, 0, len(data) - 1)
+    lower = np.floor(position).astype(np.int64)
+    upper = np.ceil(position).astype(np.int64)
+    fraction = position - lower
+
+    values = data[lower] + (data[upper] - data[lower]) * fraction
+    nonempty = counts > 0
+    result[nonempty] = values[nonempty]
+
+    return result
+
+
+def build_cohort(records: Sequence[CombinedVariantOutput]) -> Dict[str, GeneMatrix]:
+    """
+    Builds gene-by-sample matrices from the small variant, gene amplification
+    and fusion sections of many `CombinedVariantOutput` objects. Samples are
+    labelled by their DNA Sample ID.
+
+    The following matrices are returned:
+
+        - `variant_count`: number of small variants per gene and sample
+        - `vaf`: highest variant allele frequency per gene and sample
+        - `fold_change`: amplification fold change per gene and sample
+        - `fusion_count`: number of fusion calls per gene pair and sample
+
+    Args:
+        records: `CombinedVariantOutput` objects, one per sample
+
+    Returns:
+        a dict of `GeneMatrix` objects
+    """
+    samples = np.asarray(
+            [record.analysis_details["DNA Sample ID"] for record in records],
+            dtype=str)
+
+    variant_gene, variant_vaf = SMALL_VARIANT_FIELDS
+    amplification_gene, fold_change = GENE_AMPLIFICATION_FIELDS
+    gene_pair, = FUSION_FIELDS
+
+    keys, columns, values = _collect(records, "Small Variants", variant_gene)
+    variant_count = _build_matrix(keys, columns, values, samples, "sum")
+
+    keys, columns, values = _collect(records, "Small Variants", variant_gene, variant_vaf)
+    vaf = _build_matrix(keys, columns, values, samples, "max")
+
+    keys, columns, values = _collect(
+            records, "Gene Amplifications", amplification_gene, fold_change)
+    amplifications = _build_matrix(keys, columns, values, samples, "max")
+
+    keys, columns, values = _collect(records, "Fusions", gene_pair)
+    fusion_count = _build_matrix(keys, columns, values, samples, "sum")
+
+    return {
+            "variant_count": variant_count,
+            "vaf": vaf,
+            "fold_change": amplifications,
+            "fusion_count": fusion_count,
+            }
+
+
+def summarise(
+        gene_matrix: GeneMatrix,
+        percentiles: List[int] = COHORT_PERCENTILES) -> pd.DataFrame:
+    """
+    Summarises each gene across the cohort. Percentiles are computed
+    over the samples in which the gene was observed.
+
+    Args:
+        gene_matrix: a `GeneMatrix` as produced by `build_cohort()`
+        percentiles: percentiles to compute, in the range [0, 100]
+
+    Returns:
+        a `pd.DataFrame` with one row per gene, sorted by recurrence
+    """
+    matrix = gene_matrix.matrix
+    counts = np.diff(matrix.indptr)
+    quantiles = _row_quantiles(
+            matrix.data, matrix.indptr, np.asarray(percentiles) / 100)
+
+    df = pd.DataFrame(quantiles, columns=[f"P{p}" for p in percentiles])
+    df.insert(0, "Gene", gene_matrix.genes)
+    df.insert(1, "Samples", counts)
+    df.insert(2, "Recurrence", counts / max(len(gene_matrix.samples), 1))
+
+    return df.sort_values(["Samples", "Gene"], ascending=[False, True],
+            ignore_index=True)
+
+
+def flag_outliers(gene_matrix: GeneMatrix, threshold: float = 3.5) -> pd.DataFrame:
+    """
+    Flags observations that are outliers within their gene, using the
+    modified z-score (based on the median absolute deviation) of the
+    samples in which the gene was observed. Genes with a median absolute
+    deviation of zero are not flagged.
+
+    Args:
+        gene_matrix: a `GeneMatrix` as produced by `build_cohort()`
+        threshold: absolute modified z-score above which an observation
+            is flagged
+
+    Returns:
+        a `pd.DataFrame` with one row per flagged observation
+    """
+    matrix = gene_matrix.matrix
+    counts = np.diff(matrix.indptr)
+    row_ids = np.repeat(np.arange(matrix.shape[0]), counts)
+
+    median = _row_quantiles(matrix.data, matrix.indptr, [0.5])[:, 0]
+    deviation = matrix.data - median[row_ids]
+    mad = _row_quantiles(np.abs(deviation), matrix.indptr, [0.5])[:, 0]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        score = 0.6745 * deviation / mad[row_ids]
+
+    flagged = (mad[row_ids] > 0) & (np.abs(score) > threshold)
+
+    return pd.DataFrame({
+            "Gene": gene_matrix.genes[row_ids[flagged]],
+            "Sample": gene_matrix.samples[matrix.indices[flagged]],
+            "Value": matrix.data[flagged],
+            "Modified Z-Score": score[flagged],
+            })
+
+
+def cohort_tables(
+        matrices: Dict[str, GeneMatrix],
+        top_n: int = 20) -> Dict[str, pd.DataFrame]:
+    """
+    Produces the tables shown in the cohort section of the report
+
+    Args:
+        matrices: dict of `GeneMatrix` objects as produced by `build_cohort()`
+        top_n: number of most recurrent genes to include per table
+
+    Returns:
+        a dict mapping table titles to `pd.DataFrame` objects
+    """
+    tables = {
+            "Small Variants (VAF)": summarise(matrices["vaf"]).head(top_n),
+            "Gene Amplifications (Fold Change)":
+                summarise(matrices["fold_change"]).head(top_n),
+            "Fusions": summarise(matrices["fusion_count"], percentiles=[])
+                .head(top_n),
+            "Gene Amplification Outliers":
+                flag_outliers(matrices["fold_change"]),
+            }
+
+    return {title: df.round(3) for title, df in tables.items()}
@@ -7,3 +7,9 @@ MSI_FIELDS = ["Usable MSI Sites",
 TMB_FIELDS = ["Total TMB",
         "Coding Region Size in Megabases",
         "Number of Passing Eligible Variants"]
+SMALL_VARIANT_FIELDS = ["Gene", "Allele Frequency"]
+GENE_AMPLIFICATION_FIELDS = ["Gene", "Fold Change"]
+FUSION_FIELDS = ["Gene Pair"]
+COHORT_PERCENTILES = [5, 25, 50, 75, 95]
+CACHE_DIR = "~/.cache/tso500reporter"
+CACHE_MAX_BYTES = 512 * 1024 ** 2
@@ -19,3 +19,35 @@ class DuplicateKeyError(Exception):
                 ', '.join(duplicate_keys)
                 )
         super().__init__(self.message)
+
+
+class InputPlanningWarning(UserWarning):
+    """
+    Warning raised when the samplesheet and the CombinedVariantOutput
+    files do not match up, e.g. a samplesheet row with no CombinedVariantOutput
+    file, or a CombinedVariantOutput file with no samplesheet row.
+    """
+
+
+class PreflightError(Exception):
+    """
+    Exception raised when preflight checks find errors in the input
+    files, before any of them are parsed in full.
+
+    Attributes:
+        report: the `preflight.PreflightReport` containing the errors
+    """
+
+    def __init__(self, report) -> None:
+        self.report = report
+        self.message = "Preflight checks failed:\n{0}".format(
+                '\n'.join(str(issue) for issue in report.errors)
+                )
+        super().__init__(self.message)
+
+
+class PreflightWarning(UserWarning):
+    """
+    Warning raised for problems found by preflight checks which parsing
+    tolerates, but which may indicate a problem with the input files.
+    """
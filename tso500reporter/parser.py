@@ -413,16 +413,27 @@ def parse_variant_stats_data(*filepaths: str) -> pd.DataFrame:
     Returns:
         a `pd.DataFrame` object combining all of the input as one dataset
     """
-    dataset = []
+    dataset = [CombinedVariantOutput(f) for f in filepaths]
+    return variant_stats_from_records(*dataset)
 
-    for f in filepaths:
-        dataset.append(CombinedVariantOutput(f))
 
+def variant_stats_from_records(*records: CombinedVariantOutput) -> pd.DataFrame:
+    """
+    Combines already-parsed `CombinedVariantOutput` objects into a single
+    `pd.DataFrame`, as described in `parse_variant_stats_data()`. Useful
+    when the parsed records are needed elsewhere too.
+
+    Args:
+        records: `CombinedVariantOutput` objects as separate positional arguments
+
+    Returns:
+        a `pd.DataFrame` object combining all of the input as one dataset
+    """
     fields = ["Analysis Details", "Sequencing Run Details", "TMB", "MSI"]
-    filtered_dataset = [[record.json[field] for field in fields] for record in dataset]
+    filtered_dataset = [[record.json[field] for field in fields] for record in records]
 
-    records = map(flatten_record, filtered_dataset)
-    df = pd.DataFrame(records)
+    flattened = map(flatten_record, filtered_dataset)
+    df = pd.DataFrame(flattened)
 
     numeric_cols = TMB_FIELDS + MSI_FIELDS
 
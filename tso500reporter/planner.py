@@ -0,0 +1,143 @@
+"""
+Plans which input files are needed for a report before any of them
+are parsed in full
+"""
+from collections import defaultdict
+import glob
+import os
+from typing import Dict, List
+import warnings
+
+from .exceptions import InputPlanningWarning
+from .parser import SampleSheet
+
+CVO_GLOB = "*CombinedVariantOutput.tsv"
+
+
+class InputPlan(object):
+    """
+    Matches `<SAMPLE>_CombinedVariantOutput.tsv` files to samplesheet
+    rows by Pair ID, and works out which files will end up in the report
+    (i.e., those with at least one non-RNA samplesheet row, or none at all)
+    without parsing them in full. Mismatches between the samplesheet and
+    the files are reported as `InputPlanningWarning`s.
+
+    Basic usage:
+
+        >>> from tso500reporter.planner import InputPlan
+        >>> plan = InputPlan("SampleSheet.csv", run_dir="/path/to/run")
+        >>> plan.variant_files
+
+    Attributes:
+        samplesheet: the parsed `SampleSheet`
+        index: samplesheet rows indexed by Pair_ID, then Sample_Type
+        pair_ids: Pair ID of each candidate CombinedVariantOutput file
+        variant_files: CombinedVariantOutput files to parse for the report
+        unmatched_files: files with no samplesheet row
+        missing_pairs: Pair_IDs of non-RNA samplesheet rows with no file
+    """
+    def __init__(self,
+                 samplesheet: str,
+                 variant_data: List[str] = None,
+                 run_dir: str = None) -> None:
+        """
+        Inits InputPlan with the samplesheet and either a list of
+        CombinedVariantOutput files or a run directory to search for them
+
+        Args:
+            samplesheet: path to samplesheet
+            variant_data: paths to <SAMPLE>_CombinedVariantOutput.tsv files
+            run_dir: directory to search (recursively) for
+                <SAMPLE>_CombinedVariantOutput.tsv files
+        """
+        if variant_data is None:
+            variant_data = discover_variant_files(run_dir)
+
+        self.samplesheet = SampleSheet(samplesheet)
+        self.index = index_samplesheet(self.samplesheet.data)
+        self.pair_ids = {f: read_pair_id(f) for f in variant_data}
+
+        self.variant_files = []
+        self.unmatched_files = []
+
+        for filepath, pair_id in self.pair_ids.items():
+            if pair_id is None:
+                warnings.warn(
+                        f"No Pair ID found in {filepath}; skipping",
+                        InputPlanningWarning)
+            elif pair_id not in self.index:
+                warnings.warn(
+                        f"No samplesheet row for {filepath} (Pair ID {pair_id})",
+                        InputPlanningWarning)
+                self.unmatched_files.append(filepath)
+                self.variant_files.append(filepath)
+            elif set(self.index[pair_id]) != {"RNA"}:
+                self.variant_files.append(filepath)
+
+        found = set(self.pair_ids.values())
+        self.missing_pairs = [
+                pair_id for pair_id, rows in self.index.items()
+                if pair_id not in found and set(rows) != {"RNA"}]
+
+        for pair_id in self.missing_pairs:
+            warnings.warn(
+                    f"No CombinedVariantOutput file for samplesheet Pair_ID {pair_id}",
+                    InputPlanningWarning)
+
+
+def index_samplesheet(data: List[Dict[str, str]]) -> Dict[str, Dict[str, List[Dict]]]:
+    """
+    Indexes samplesheet *[Data]* rows by Pair_ID, then by Sample_Type
+
+    Args:
+        data: samplesheet data, as in `SampleSheet.data`
+
+    Returns:
+        a dict of dicts of samplesheet rows
+    """
+    index = defaultdict(lambda: defaultdict(list))
+
+    for row in data:
+        index[row.get("Pair_ID")][row.get("Sample_Type")].append(row)
+
+    return {pair_id: dict(rows) for pair_id, rows in index.items()}
+
+
+def discover_variant_files(run_dir: str) -> List[str]:
+    """
+    Recursively finds <SAMPLE>_CombinedVariantOutput.tsv files in a
+    run directory, in sorted order
+    """
+    pattern = os.path.join(run_dir, "**", CVO_GLOB)
+    return sorted(glob.glob(pattern, recursive=True))
+
+
+def read_pair_id(filepath: str) -> str:
+    """
+    Reads the Pair ID from the *[Analysis Details]* section of a
+    <SAMPLE>_CombinedVariantOutput.tsv file, stopping as soon as it
+    is found rather than reading the whole file
+
+    Args:
+        filepath: path to <SAMPLE>_CombinedVariantOutput.tsv file
+
+    Returns:
+        the Pair ID, or `None` if the section has no Pair ID
+    """
+    in_analysis_details = False
+
+    with open(filepath, "r") as f:
+        for line in f:
+            line = line.rstrip("\n")
+
+            if line.startswith("["):
+                if in_analysis_details:
+                    # reached the next section without finding it
+                    return None
+                in_analysis_details = line.startswith("[Analysis Details]")
+            elif in_analysis_details:
+                row = line.split("\t")
+                if row[0] == "Pair ID" and len(row) > 1:
+                    return row[1]
+
+    return None
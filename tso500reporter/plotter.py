@@ -7,6 +7,8 @@ import matplotlib.pyplot as plt
 import seaborn as sns
 import pandas as pd
 
+from .cache import RenderCache, make_key
+
 
 def generate_plot(
         dataset: pd.DataFrame,
@@ -43,3 +45,47 @@ def generate_plot(
         ax.set_title(y_axis_title)
 
     return fig
+
+
+def save_plot(
+        dataset: pd.DataFrame,
+        x_column: str,
+        y_columns: List[str],
+        filepath: str,
+        fwidth: int = 25,
+        fheight: int = 10,
+        cache: RenderCache = None) -> None:
+    """
+    Generates barplots as in `generate_plot()` and saves them as a PNG.
+    If a cache is given, the plot is only redrawn when the plotted
+    columns or the plot parameters have changed.
+
+    Args:
+        dataset: a `pd.DataFrame` object
+        x_column: x axis variable
+        y_columns: y axis variables
+        filepath: path to write the PNG to
+        fwidth: figure width in inches
+        fheight: figure height in inches
+        cache: optional `RenderCache` to reuse previously drawn plots
+
+    Returns:
+        None
+    """
+    if cache is not None:
+        key = make_key("plot", dataset[[x_column] + y_columns],
+                x_column, y_columns, fwidth, fheight)
+        if cache.fetch(key, ".png", filepath):
+            return
+
+    fig = generate_plot(
+            dataset=dataset,
+            x_column=x_column,
+            y_columns=y_columns,
+            fwidth=fwidth,
+            fheight=fheight)
+    fig.savefig(filepath, bbox_inches="tight")
+    plt.close(fig)
+
+    if cache is not None:
+        cache.put_file(key, ".png", filepath)
@@ -0,0 +1,331 @@
+"""
+Fast, streaming checks of run inputs, so that malformed or half-written
+files are caught before any expensive parsing or rendering
+"""
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+import re
+from typing import Dict, List, NamedTuple, Optional
+
+from .constants import TMB_FIELDS, MSI_FIELDS
+
+# below this many files, starting worker processes costs more than it saves
+PARALLEL_THRESHOLD = 64
+
+
+class FileSpec(NamedTuple):
+    """
+    Expected layout of a TSO500 input or output file, mirroring the
+    arguments passed to `parser.IlluminaFile` by its derived classes
+    """
+    delim: str
+    skip: int
+    tabular_sections: List[str]
+    array_sections: List[str]
+    required_sections: List[str]
+    required_keys: Dict[str, List[str]]
+    required_columns: Dict[str, List[str]]
+    flattened_sections: List[str]
+
+
+class Issue(NamedTuple):
+    """
+    A problem found in an input file. `line` is `None` for problems
+    that concern the file as a whole (e.g. a missing section).
+    """
+    filename: str
+    line: Optional[int]
+    severity: str
+    message: str
+
+    def __str__(self) -> str:
+        location = self.filename if self.line is None else f"{self.filename}:{self.line}"
+        return f"{location}: {self.severity}: {self.message}"
+
+
+FILE_SPECS = {
+        "CombinedVariantOutput": FileSpec(
+            delim="\t",
+            skip=2,
+            tabular_sections=["Gene Amplifications", "Splice Variants",
+                "Fusions", "Small Variants"],
+            array_sections=[],
+            required_sections=["Analysis Details", "Sequencing Run Details",
+                "TMB", "MSI", "Gene Amplifications", "Splice Variants",
+                "Fusions", "Small Variants"],
+            required_keys={
+                "Analysis Details": ["Pair ID", "DNA Sample ID"],
+                "Sequencing Run Details": ["Run Name"],
+                "TMB": TMB_FIELDS,
+                "MSI": MSI_FIELDS},
+            required_columns={},
+            flattened_sections=["Analysis Details", "Sequencing Run Details",
+                "TMB", "MSI"]),
+        "SampleSheet": FileSpec(
+            delim=",",
+            skip=0,
+            tabular_sections=["Data"],
+            array_sections=["Reads"],
+            required_sections=["Header", "Reads", "Settings", "Data"],
+            required_keys={},
+            required_columns={"Data": ["Pair_ID", "Sample_Type"]},
+            flattened_sections=[]),
+        }
+
+
+class PreflightReport(object):
+    """
+    Results of preflight checks over a set of input files
+
+    Basic usage:
+
+        >>> from tso500reporter.preflight import run_preflight
+        >>> report = run_preflight("SampleSheet.csv", cvo_filepaths)
+        >>> report.ok
+        >>> report.to_dict()
+
+    Attributes:
+        filenames: files that were checked
+        issues: all `Issue`s found, in input file order
+    """
+    def __init__(self, filenames: List[str], issues: List[Issue]) -> None:
+        self.filenames = filenames
+        self.issues = issues
+
+    @property
+    def errors(self) -> List[Issue]:
+        """
+        Returns issues that would cause parsing to fail or give wrong results
+        """
+        return [issue for issue in self.issues if issue.severity == "error"]
+
+    @property
+    def warnings(self) -> List[Issue]:
+        """
+        Returns issues that parsing tolerates, but which may indicate a problem
+        """
+        return [issue for issue in self.issues if issue.severity == "warning"]
+
+    @property
+    def ok(self) -> bool:
+        """
+        Returns True if no errors were found
+        """
+        return len(self.errors) == 0
+
+    def to_dict(self) -> dict:
+        """
+        Returns the report as a JSON-serialisable dict
+        """
+        return {
+                "ok": self.ok,
+                "files_checked": len(self.filenames),
+                "errors": [issue._asdict() for issue in self.errors],
+                "warnings": [issue._asdict() for issue in self.warnings],
+                }
+
+
+def check_file(filename: str, spec_name: str) -> List[Issue]:
+    """
+    Streams through a file line by line, checking section headers,
+    the number of columns in each tabular row, required keys and
+    columns, and keys duplicated across flattened sections, without
+    building the full dict model that `parser.IlluminaFile` does.
+
+    Args:
+        filename: path to file
+        spec_name: key of the file's layout in `FILE_SPECS`
+
+    Returns:
+        a list of `Issue`s; empty if the file passed all checks
+    """
+    spec = FILE_SPECS[spec_name]
+    issues = []
+
+    def add(severity, line, message):
+        issues.append(Issue(filename, line, severity, message))
+
+    section_break = re.compile(f"^{re.escape(spec.delim)}+$")
+    section_keys = {}
+    section_columns = {}
+    header = None
+    data_type = None
+    columns = []
+    awaiting_columns = False
+    last_line = "\n"
+    # index into `issues` of the short-row warning for the latest line, if any
+    short_row = None
+
+    try:
+        with open(filename, "r") as f:
+            for line_number, line in enumerate(f, start=1):
+                if line_number <= spec.skip:
+                    continue
+
+                last_line = line
+                short_row = None
+                line = line.rstrip("\n")
+
+                # the line after a tabular section header holds the column names
+                if awaiting_columns:
+                    awaiting_columns = False
+                    if line.startswith("["):
+                        add("error", line_number,
+                                f"[{header}] section has no column names")
+                    else:
+                        columns = line.rstrip().split(spec.delim)
+                        section_columns[header] = columns
+                        continue
+
+                if section_break.match(line):
+                    continue
+
+                elif not line:
+                    add("error", line_number, "empty line")
+
+                elif line[0] == "[":
+                    match = re.search(r"\[(.+)\]", line)
+                    if match is None:
+                        add("error", line_number, f"malformed section header: {line}")
+                        continue
+
+                    header = match.group(1)
+                    if header in section_keys:
+                        add("warning", line_number, f"[{header}] section repeated")
+
+                    section_keys[header] = []
+                    if header in spec.tabular_sections:
+                        data_type = "tabular"
+                        awaiting_columns = True
+                    elif header in spec.array_sections:
+                        data_type = "array"
+                    else:
+                        data_type = "record"
+
+                elif header is None:
+                    add("error", line_number, "data before first section header")
+
+                elif data_type == "tabular":
+                    # split as `IlluminaFile._read()` does, so trailing
+                    # empty values are counted as columns
+                    row = line.split(spec.delim)
+                    if row == ["NA"]:
+                        # an empty section holds a single NA row
+                        continue
+                    elif len(row) > len(columns) and any(row[len(columns):]):
+                        add("warning", line_number,
+                                f"[{header}] row has {len(row)} columns, "
+                                f"expected {len(columns)}; extra values "
+                                "will be ignored")
+                    elif len(row) < len(columns):
+                        short_row = len(issues)
+                        add("warning", line_number,
+                                f"[{header}] row has {len(row)} columns, "
+                                f"expected {len(columns)}; missing values "
+                                "will be filled with NA")
+
+                elif data_type == "record":
+                    row = line.split(spec.delim)
+                    if len(row) < 2:
+                        add("error", line_number,
+                                f"[{header}] row has no value: {line}")
+                    else:
+                        section_keys[header].append(row[0])
+
+    except (OSError, UnicodeDecodeError) as e:
+        add("error", None, f"could not be read: {e}")
+        return issues
+
+    if awaiting_columns:
+        add("error", None, f"[{header}] section has no column names")
+
+    # any of these in a file without a final newline means it was cut off
+    truncated = False
+
+    for section in spec.required_sections:
+        if section not in section_keys:
+            truncated = True
+            add("error", None, f"missing [{section}] section")
+
+    for section, keys in spec.required_keys.items():
+        if section in section_keys:
+            missing = [key for key in keys if key not in section_keys[section]]
+            if missing:
+                truncated = True
+                add("error", None,
+                        f"[{section}] section missing keys: {', '.join(missing)}")
+
+    for section, required in spec.required_columns.items():
+        if section in section_columns:
+            missing = [col for col in required if col not in section_columns[section]]
+            if missing:
+                add("error", None,
+                        f"[{section}] section missing columns: {', '.join(missing)}")
+
+    # mirrors the check in `parser.flatten_record()`
+    key_counts = Counter(
+            key
+            for section in spec.flattened_sections
+            for key in set(section_keys.get(section, [])))
+    duplicate_keys = [key for key, count in key_counts.items() if count > 1]
+    if duplicate_keys:
+        add("error", None,
+                f"duplicate keys across sections: {', '.join(duplicate_keys)}")
+
+    if not last_line.endswith("\n"):
+        if short_row is not None:
+            # the final row was cut off mid-write, not left short on purpose
+            truncated = True
+            issues[short_row] = issues[short_row]._replace(
+                    severity="error",
+                    message=issues[short_row].message.split(";")[0]
+                    + "; the row is incomplete")
+        if truncated:
+            add("error", None,
+                    "does not end with a newline and is incomplete; "
+                    "it is truncated or still being written")
+        else:
+            add("warning", None, "does not end with a newline")
+
+    return issues
+
+
+def run_preflight(
+        samplesheet: Optional[str],
+        variant_data: List[str],
+        workers: int = None) -> PreflightReport:
+    """
+    Checks the samplesheet and <SAMPLE>_CombinedVariantOutput.tsv files
+    in parallel. See `check_file()` for the checks made.
+
+    Args:
+        samplesheet: path to samplesheet, or `None` to check only
+            the CombinedVariantOutput files
+        variant_data: paths to <SAMPLE>_CombinedVariantOutput.tsv files
+        workers: number of worker processes. By default, files are checked
+            serially below `PARALLEL_THRESHOLD` files, and otherwise with
+            one process per CPU
+
+    Returns:
+        a `PreflightReport` object
+    """
+    filenames = list(variant_data)
+    spec_names = ["CombinedVariantOutput"] * len(variant_data)
+
+    if samplesheet is not None:
+        filenames.insert(0, samplesheet)
+        spec_names.insert(0, "SampleSheet")
+
+    if workers is None and len(filenames) < PARALLEL_THRESHOLD:
+        workers = 1
+
+    if workers == 1:
+        results = map(check_file, filenames, spec_names)
+        issues = [issue for result in results for issue in result]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = executor.map(check_file, filenames, spec_names,
+                    chunksize=max(len(filenames) // 32, 1))
+            issues = [issue for result in results for issue in result]
+
+    return PreflightReport(filenames, issues)
@@ -2,12 +2,19 @@
 Handles reporting of plots and data to HTML and PDF
 """
 import base64
+import glob
+import os
+from typing import Dict
+
 from jinja2 import Environment, FileSystemLoader
 import pandas as pd
 from weasyprint import HTML
 
+from .cache import RenderCache, make_key
 from .constants import TMB_FIELDS, MSI_FIELDS
 
+TABLE_CLASSES = ["table", "table-striped", "table-hover", "table-bordered"]
+
 
 def to_base64(png: str) -> str:
     """
@@ -21,6 +28,25 @@ def to_base64(png: str) -> str:
     return f"data:image/png;base64,{encoded_string}"
 
 
+def to_html_table(dataset: pd.DataFrame, cache: RenderCache = None) -> str:
+    """
+    Renders a `pd.DataFrame` as a HTML table fragment, reusing a
+    previously rendered fragment if the cache holds one for the same data.
+    """
+    if cache is not None:
+        key = make_key("table", dataset, TABLE_CLASSES)
+        html = cache.get_text(key, ".html")
+        if html is not None:
+            return html
+
+    html = dataset.to_html(index=False, classes=TABLE_CLASSES)
+
+    if cache is not None:
+        cache.put(key, ".html", html.encode())
+
+    return html
+
+
 def write_html(
         dataset: pd.DataFrame,
         run_name: str = None,
@@ -28,7 +54,9 @@ def write_html(
         report_dir: str = "report",
         template_dir: str = "templates",
         html_template_name: str = "template.html",
-        css_template_name: str = "styles.css") -> None:
+        css_template_name: str = "styles.css",
+        cohort_data: Dict[str, pd.DataFrame] = None,
+        cache: RenderCache = None) -> None:
     """
     Writes the dataset (as a table) and plots to a HTML.
     The function assumes the plots have already been
@@ -40,12 +68,20 @@ def write_html(
         report_dir: directory to store the reports
         template_dir: directory containing the HTML and CSS templates
         template_name: the filename of the HTML template to use
+        cohort_data: optional dict of titled tables for the cohort
+            statistics section, as produced by `cohort.cohort_tables()`
+        cache: optional `RenderCache` to reuse previously rendered tables
 
     Returns:
         None
     """
-    tmb_data = dataset[["DNA Sample ID"] + TMB_FIELDS]
-    msi_data = dataset[["DNA Sample ID"] + MSI_FIELDS]
+    tmb_table = to_html_table(dataset[["DNA Sample ID"] + TMB_FIELDS], cache)
+    msi_table = to_html_table(dataset[["DNA Sample ID"] + MSI_FIELDS], cache)
+
+    cohort_tables = None
+    if cohort_data:
+        cohort_tables = {title: to_html_table(df, cache)
+                for title, df in cohort_data.items()}
 
     # Create a template Environment
     env = Environment(loader=FileSystemLoader(template_dir))
@@ -65,9 +101,10 @@ def write_html(
     html = template.render(page_title_text='TSO500 TMB & MSI',
                            run_name=run_name,
                            tmb_plot_path=tmb_image,
-                           tmb_data=tmb_data,
+                           tmb_table=tmb_table,
                            msi_plot_path=msi_image,
-                           msi_data=msi_data,
+                           msi_table=msi_table,
+                           cohort_tables=cohort_tables,
                            template_dir=template_dir,
                            css_template=css_template_name)
 
@@ -76,16 +113,35 @@ def write_html(
         f.write(html)
 
 
-def write_pdf(report_dir: str) -> None:
+def write_pdf(report_dir: str, cache: RenderCache = None) -> None:
     """
     Produces a PDF report using the HTML report
     (produced by `write_html`) as template.
 
     Args:
         report_dir: the directory containing the reports
-        css_filepath: the path to the CSS template
+        cache: optional `RenderCache`; the PDF is only laid out
+            again when the HTML report has changed
 
     Returns:
         None
     """
-    HTML(f"{report_dir}/report.html").write_pdf(target=f"{report_dir}/report.pdf")
+    html_path = f"{report_dir}/report.html"
+    pdf_path = f"{report_dir}/report.pdf"
+
+    if cache is not None:
+        # plots may be linked rather than embedded in the HTML, so
+        # their contents are part of the key too. Paths are relative to
+        # `report_dir`, so identical reports elsewhere share the PDF.
+        parts = []
+        for path in [html_path] + sorted(glob.glob(f"{report_dir}/img/*.png")):
+            with open(path, "rb") as f:
+                parts.extend([os.path.relpath(path, report_dir), f.read()])
+        key = make_key("pdf", *parts)
+        if cache.fetch(key, ".pdf", pdf_path):
+            return
+
+    HTML(html_path).write_pdf(target=pdf_path)
+
+    if cache is not None:
+        cache.put_file(key, ".pdf", pdf_path)